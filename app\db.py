@@ -24,7 +24,9 @@ async def init_database(db_path):
             parent_owner_login TEXT,
             parent_owner_html_url TEXT,
             parent_owner_avatar_url TEXT,
-            parent_updated_at TEXT
+            parent_updated_at TEXT,
+            default_branch TEXT,
+            parent_default_branch TEXT
         )
         ''')
 
@@ -36,7 +38,8 @@ async def init_database(db_path):
             description TEXT,
             html_url TEXT,
             stargazers_count INTEGER,
-            owner_login TEXT
+            owner_login TEXT,
+            updated_at TEXT
         )
         ''')
 
@@ -49,24 +52,103 @@ async def init_database(db_path):
         )
         ''')
 
+        await db.execute('''
+        CREATE TABLE IF NOT EXISTS mirror_state (
+            full_name TEXT PRIMARY KEY,
+            local_path TEXT,
+            mirrored_updated_at TEXT,
+            mirrored_at TEXT,
+            status TEXT,
+            error TEXT
+        )
+        ''')
+
+        await db.execute('''
+        CREATE TABLE IF NOT EXISTS fork_status (
+            full_name TEXT PRIMARY KEY,
+            updated_at TEXT,
+            parent_updated_at TEXT,
+            ahead_by INTEGER,
+            behind_by INTEGER,
+            status TEXT,
+            checked_at TEXT,
+            error TEXT
+        )
+        ''')
+
+        await db.execute('''
+        CREATE TABLE IF NOT EXISTS followed_repos (
+            full_name TEXT PRIMARY KEY,
+            owner_login TEXT,
+            name TEXT,
+            description TEXT,
+            html_url TEXT,
+            stargazers_count INTEGER,
+            language TEXT,
+            updated_at TEXT,
+            pushed_at TEXT
+        )
+        ''')
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_followed_repos_updated_at ON followed_repos (updated_at DESC)")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_followed_repos_owner_login ON followed_repos (owner_login)")
+
+        await db.execute('''
+        CREATE TABLE IF NOT EXISTS followed_sync (
+            login TEXT PRIMARY KEY,
+            etag TEXT,
+            latest_updated_at TEXT,
+            synced_at TEXT,
+            full_synced_at TEXT
+        )
+        ''')
+
+        await db.execute('''
+        CREATE TABLE IF NOT EXISTS snapshot_imports (
+            snapshot_id TEXT PRIMARY KEY,
+            path TEXT,
+            lines_done INTEGER,
+            completed BOOLEAN,
+            updated_at TEXT
+        )
+        ''')
+
+        # 旧数据库升级: 补充后来新增的列
+        await ensure_columns(db, 'starred_repos', {'updated_at': 'TEXT'})
+        await ensure_columns(db, 'repos', {'default_branch': 'TEXT', 'parent_default_branch': 'TEXT'})
+        await ensure_columns(db, 'followed_sync', {'full_synced_at': 'TEXT'})
+
         await db.commit()
 
+async def ensure_columns(db, table, columns):
+    cursor = await db.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in await cursor.fetchall()}
+    for name, column_type in columns.items():
+        if name not in existing:
+            await db.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+
 async def save_repo_to_db(repo, db_path):
     async with aiosqlite.connect(db_path) as db:
-        cursor = await db.execute("SELECT updated_at FROM repos WHERE full_name = ?", (repo['full_name'],))
+        cursor = await db.execute("SELECT updated_at, parent_updated_at, default_branch FROM repos WHERE full_name = ?", (repo['full_name'],))
         existing = await cursor.fetchone()
 
         if existing:
             existing_updated_at = datetime.strptime(existing[0], "%Y-%m-%dT%H:%M:%SZ")
             new_updated_at = datetime.strptime(repo['updated_at'], "%Y-%m-%dT%H:%M:%SZ")
-            if new_updated_at > existing_updated_at:
+            # 原仓库有更新时也需要刷新, Fork 落后分析依赖 parent_updated_at;
+            # 获取原仓库信息失败时 repo 中没有 parent, 不能据此判断, 也不覆盖已有的原仓库信息
+            parent_changed = 'parent' in repo and repo['parent'].get('updated_at') != existing[1]
+            if new_updated_at > existing_updated_at or parent_changed or existing[2] is None:
                 await db.execute('''
                 UPDATE repos SET
                     name = ?, description = ?, html_url = ?, stargazers_count = ?,
                     owner_login = ?, owner_html_url = ?, owner_avatar_url = ?, is_fork = ?,
-                    updated_at = ?, parent_full_name = ?, parent_html_url = ?,
-                    parent_owner_login = ?, parent_owner_html_url = ?,
-                    parent_owner_avatar_url = ?, parent_updated_at = ?
+                    updated_at = ?, parent_full_name = COALESCE(?, parent_full_name),
+                    parent_html_url = COALESCE(?, parent_html_url),
+                    parent_owner_login = COALESCE(?, parent_owner_login),
+                    parent_owner_html_url = COALESCE(?, parent_owner_html_url),
+                    parent_owner_avatar_url = COALESCE(?, parent_owner_avatar_url),
+                    parent_updated_at = COALESCE(?, parent_updated_at),
+                    default_branch = ?, parent_default_branch = COALESCE(?, parent_default_branch)
                 WHERE full_name = ?
                 ''', (
                     repo['name'], repo['description'], repo['html_url'],
@@ -78,6 +160,8 @@ async def save_repo_to_db(repo, db_path):
                     repo.get('parent', {}).get('owner', {}).get('html_url'),
                     repo.get('parent', {}).get('owner', {}).get('avatar_url'),
                     repo.get('parent', {}).get('updated_at'),
+                    repo.get('default_branch'),
+                    repo.get('parent', {}).get('default_branch'),
                     repo['full_name']
                 ))
         else:
@@ -86,8 +170,9 @@ async def save_repo_to_db(repo, db_path):
                 full_name, github_id, name, description, html_url, stargazers_count,
                 owner_login, owner_html_url, owner_avatar_url, is_fork, updated_at,
                 parent_full_name, parent_html_url, parent_owner_login,
-                parent_owner_html_url, parent_owner_avatar_url, parent_updated_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                parent_owner_html_url, parent_owner_avatar_url, parent_updated_at,
+                default_branch, parent_default_branch
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 repo['full_name'], repo['id'], repo['name'], repo['description'], repo['html_url'],
                 repo['stargazers_count'], repo['owner']['login'], repo['owner']['html_url'],
@@ -97,34 +182,39 @@ async def save_repo_to_db(repo, db_path):
                 repo.get('parent', {}).get('owner', {}).get('login'),
                 repo.get('parent', {}).get('owner', {}).get('html_url'),
                 repo.get('parent', {}).get('owner', {}).get('avatar_url'),
-                repo.get('parent', {}).get('updated_at')
+                repo.get('parent', {}).get('updated_at'),
+                repo.get('default_branch'),
+                repo.get('parent', {}).get('default_branch')
             ))
 
         await db.commit()
 
 async def save_starred_repo_to_db(repo, db_path):
     async with aiosqlite.connect(db_path) as db:
-        cursor = await db.execute("SELECT stargazers_count FROM starred_repos WHERE full_name = ?", (repo['full_name'],))
+        cursor = await db.execute("SELECT stargazers_count, updated_at FROM starred_repos WHERE full_name = ?", (repo['full_name'],))
         existing = await cursor.fetchone()
 
         if existing:
-            if repo['stargazers_count'] != existing[0]:
+            if repo['stargazers_count'] != existing[0] or repo.get('updated_at') != existing[1]:
                 await db.execute('''
                 UPDATE starred_repos SET
-                    name = ?, description = ?, html_url = ?, stargazers_count = ?, owner_login = ?
+                    name = ?, description = ?, html_url = ?, stargazers_count = ?, owner_login = ?,
+                    updated_at = ?
                 WHERE full_name = ?
                 ''', (
                     repo['name'], repo['description'], repo['html_url'],
-                    repo['stargazers_count'], repo['owner']['login'], repo['full_name']
+                    repo['stargazers_count'], repo['owner']['login'], repo.get('updated_at'),
+                    repo['full_name']
                 ))
         else:
             await db.execute('''
             INSERT INTO starred_repos (
-                full_name, github_id, name, description, html_url, stargazers_count, owner_login
-            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                full_name, github_id, name, description, html_url, stargazers_count, owner_login,
+                updated_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 repo['full_name'], repo['id'], repo['name'], repo['description'], repo['html_url'],
-                repo['stargazers_count'], repo['owner']['login']
+                repo['stargazers_count'], repo['owner']['login'], repo.get('updated_at')
             ))
 
         await db.commit()
@@ -151,9 +241,11 @@ async def get_all_repos(db_path):
     async with aiosqlite.connect(db_path) as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute("""
-        SELECT name, full_name, description, html_url, stargazers_count,
-               owner_login, is_fork, parent_full_name, parent_html_url
-        FROM repos
+        SELECT r.name, r.full_name, r.description, r.html_url, r.stargazers_count,
+               r.owner_login, r.is_fork, r.parent_full_name, r.parent_html_url, r.updated_at,
+               f.ahead_by, f.behind_by
+        FROM repos r
+        LEFT JOIN fork_status f ON f.full_name = r.full_name
         """)
         rows = await cursor.fetchall()
         return [dict(row) for row in rows]
@@ -172,6 +264,132 @@ async def get_followed_users(db_path):
         rows = await cursor.fetchall()
         return [dict(row) for row in rows]
 
+async def get_mirror_candidates(db_path, tables):
+    # 返回所有仓库及其镜像状态, 最近更新的优先; up_to_date 表示上次镜像成功且之后没有更新,
+    # 是否跳过还需由调用方确认镜像目录一致且仍然存在
+    selects = " UNION ALL ".join(f"SELECT full_name, updated_at FROM {table}" for table in tables)
+    async with aiosqlite.connect(db_path) as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(f"""
+        SELECT r.full_name, MAX(r.updated_at) AS updated_at, m.local_path,
+               (m.status = 'ok' AND MAX(r.updated_at) <= m.mirrored_updated_at) AS up_to_date
+        FROM ({selects}) r
+        LEFT JOIN mirror_state m ON m.full_name = r.full_name
+        GROUP BY r.full_name
+        ORDER BY updated_at DESC
+        """)
+        rows = await cursor.fetchall()
+        return [dict(row) for row in rows]
+
+async def save_mirror_state(db, full_name, local_path, updated_at, success, error):
+    await db.execute('''
+    INSERT INTO mirror_state (
+        full_name, local_path, mirrored_updated_at, mirrored_at, status, error
+    ) VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(full_name) DO UPDATE SET
+        local_path = excluded.local_path,
+        mirrored_updated_at = COALESCE(excluded.mirrored_updated_at, mirror_state.mirrored_updated_at),
+        mirrored_at = excluded.mirrored_at,
+        status = excluded.status,
+        error = excluded.error
+    ''', (
+        full_name, local_path, updated_at if success else None,
+        datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+        'ok' if success else 'failed', error or None
+    ))
+
+async def get_fork_analysis_candidates(db_path, force=False):
+    # 以存储的时间戳作为预筛选: 只有从未分析、上次失败或两端时间戳变化的 Fork 需要重新比较
+    async with aiosqlite.connect(db_path) as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute("""
+        SELECT r.full_name, r.owner_login, r.updated_at, r.parent_full_name,
+               r.parent_updated_at, r.default_branch, r.parent_default_branch
+        FROM repos r
+        LEFT JOIN fork_status f ON f.full_name = r.full_name
+        WHERE r.is_fork AND r.parent_full_name IS NOT NULL
+          AND (? OR f.full_name IS NULL OR f.status = 'error'
+               OR f.updated_at IS NOT r.updated_at
+               OR f.parent_updated_at IS NOT r.parent_updated_at)
+        """, (force,))
+        rows = await cursor.fetchall()
+        return [dict(row) for row in rows]
+
+async def save_fork_status(db, fork, ahead_by, behind_by, status, error=None):
+    await db.execute('''
+    INSERT OR REPLACE INTO fork_status (
+        full_name, updated_at, parent_updated_at, ahead_by, behind_by, status, checked_at, error
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (
+        fork['full_name'], fork['updated_at'], fork['parent_updated_at'], ahead_by, behind_by,
+        status, datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"), error
+    ))
+
+async def update_default_branches(db, full_name, default_branch, parent_default_branch):
+    await db.execute('''
+    UPDATE repos SET default_branch = ?, parent_default_branch = ? WHERE full_name = ?
+    ''', (default_branch, parent_default_branch, full_name))
+
+async def prune_followed_users(db_path, following_logins):
+    # 删除已不在关注列表中的作者, 以及为他们同步的仓库和同步状态
+    async with aiosqlite.connect(db_path) as db:
+        cursor = await db.execute("SELECT login FROM followed_users")
+        stale = [(row[0],) for row in await cursor.fetchall() if row[0] not in following_logins]
+        if stale:
+            await db.executemany("DELETE FROM followed_users WHERE login = ?", stale)
+            await db.executemany("DELETE FROM followed_sync WHERE login = ?", stale)
+            await db.executemany("DELETE FROM followed_repos WHERE owner_login = ?", stale)
+            await db.commit()
+
+async def get_followed_sync_state(db_path):
+    async with aiosqlite.connect(db_path) as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute("""
+        SELECT u.login, s.etag, s.latest_updated_at, s.full_synced_at
+        FROM followed_users u
+        LEFT JOIN followed_sync s ON s.login = u.login
+        """)
+        rows = await cursor.fetchall()
+        return [dict(row) for row in rows]
+
+async def save_followed_repos(db, login, repos, etag, latest_updated_at, replace=False):
+    # replace 为 True 时 repos 是该作者的完整仓库列表, 先清除上游已删除的仓库
+    now = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+    if replace:
+        await db.execute("DELETE FROM followed_repos WHERE owner_login = ?", (login,))
+    await db.executemany('''
+    INSERT OR REPLACE INTO followed_repos (
+        full_name, owner_login, name, description, html_url, stargazers_count,
+        language, updated_at, pushed_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [(
+        repo['full_name'], login, repo['name'], repo['description'], repo['html_url'],
+        repo['stargazers_count'], repo.get('language'), repo['updated_at'], repo.get('pushed_at')
+    ) for repo in repos])
+    await db.execute('''
+    INSERT INTO followed_sync (login, etag, latest_updated_at, synced_at, full_synced_at)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(login) DO UPDATE SET
+        etag = excluded.etag,
+        latest_updated_at = excluded.latest_updated_at,
+        synced_at = excluded.synced_at,
+        full_synced_at = COALESCE(excluded.full_synced_at, followed_sync.full_synced_at)
+    ''', (login, etag, latest_updated_at, now, now if replace else None))
+
+async def get_recent_followed_repos(db_path, limit=500):
+    async with aiosqlite.connect(db_path) as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute("""
+        SELECT r.full_name, r.owner_login, r.name, r.description, r.html_url,
+               r.stargazers_count, r.language, r.updated_at
+        FROM followed_repos r
+        JOIN followed_users u ON u.login = r.owner_login
+        ORDER BY r.updated_at DESC
+        LIMIT ?
+        """, (limit,))
+        rows = await cursor.fetchall()
+        return [dict(row) for row in rows]
+
 async def insert_repo(db_path, repo_data):
     async with aiosqlite.connect(db_path) as db:
         await db.execute('''
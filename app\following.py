@@ -0,0 +1,93 @@
+import asyncio
+import aiohttp
+import aiosqlite
+from datetime import datetime, timedelta
+from .db import get_followed_sync_state, save_followed_repos
+from .github import RateBudget, RateLimitExceeded, github_get
+
+GITHUB_API = "https://api.github.com"
+FOLLOWING_CONCURRENCY = 8
+PER_PAGE = 100
+# 增量同步发现不了上游删除的仓库, 超过这个间隔就做一次完整同步
+FULL_SYNC_INTERVAL = timedelta(days=7)
+
+def needs_full_sync(state):
+    # 只看上次完整同步的时间; 没有仓库的作者 latest_updated_at 始终为空, 不能据此判断
+    if state['full_synced_at'] is None:
+        return True
+    full_synced_at = datetime.strptime(state['full_synced_at'], "%Y-%m-%dT%H:%M:%SZ")
+    return datetime.utcnow() - full_synced_at > FULL_SYNC_INTERVAL
+
+async def fetch_user_repos(session, headers, budget, state, force=False):
+    # 返回 None 表示没有变化; 否则返回 (etag, latest_updated_at, repos, complete),
+    # complete 为 True 时 repos 是该作者的完整仓库列表
+    url = f"{GITHUB_API}/users/{state['login']}/repos?type=owner&sort=updated&direction=desc&per_page={PER_PAGE}"
+    full_sync = force or needs_full_sync(state)
+    since = None if full_sync else state['latest_updated_at']
+
+    # 第一页带上 ETag, 没有变化时返回 304, 不消耗限额
+    request_headers = dict(headers)
+    if state['etag'] and not full_sync:
+        request_headers['If-None-Match'] = state['etag']
+    status, data, response_headers = await github_get(session, url, request_headers, budget)
+    if status == 304:
+        return None
+    if status != 200:
+        raise aiohttp.ClientError(f"获取 {state['login']} 的仓库失败: HTTP {status}")
+    etag = response_headers.get('ETag')
+
+    # 第一页不满时它就是完整列表, 可以顺便清除已删除的仓库
+    if len(data) < PER_PAGE:
+        since = None
+        full_sync = True
+
+    # 按更新时间倒序分页, 遇到不晚于上次同步的仓库即停止
+    repos = []
+    page = 1
+    while True:
+        fresh = [repo for repo in data if since is None or repo['updated_at'] > since]
+        repos.extend(fresh)
+        if len(fresh) < len(data) or len(data) < PER_PAGE:
+            break
+        page += 1
+        status, data, _ = await github_get(session, f"{url}&page={page}", headers, budget)
+        if status != 200:
+            raise aiohttp.ClientError(f"获取 {state['login']} 的仓库失败: HTTP {status}")
+
+    latest_updated_at = max([repo['updated_at'] for repo in repos] + ([since] if since else []), default=None)
+    return etag, latest_updated_at, repos, full_sync
+
+async def sync_followed_repos(token, db_path, force=False, concurrency=FOLLOWING_CONCURRENCY):
+    # 返回 (有更新的作者数, 无变化的作者数, 失败的作者列表)
+    headers = {
+        'Authorization': f'token {token}',
+        'Accept': 'application/vnd.github.v3+json'
+    }
+    states = await get_followed_sync_state(db_path)
+    budget = RateBudget(concurrency)
+    updated = 0
+    unchanged = 0
+    failed = []
+
+    async def run(session, state):
+        try:
+            return state, await fetch_user_repos(session, headers, budget, state, force)
+        except (RateLimitExceeded, aiohttp.ClientError, asyncio.TimeoutError,
+                ValueError, KeyError, TypeError) as e:
+            return state, e
+
+    async with aiohttp.ClientSession() as session, aiosqlite.connect(db_path) as db:
+        for task in asyncio.as_completed([run(session, state) for state in states]):
+            state, result = await task
+            if isinstance(result, Exception):
+                failed.append((state['login'], str(result)))
+                continue
+            if result is None:
+                unchanged += 1
+                continue
+            etag, latest_updated_at, repos, complete = result
+            await save_followed_repos(db, state['login'], repos, etag, latest_updated_at, replace=complete)
+            await db.commit()
+            updated += 1
+
+    return updated, unchanged, failed
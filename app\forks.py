@@ -0,0 +1,61 @@
+import asyncio
+import aiohttp
+import aiosqlite
+from urllib.parse import quote
+from .db import get_fork_analysis_candidates, save_fork_status, update_default_branches
+from .github import RateBudget, RateLimitExceeded, github_get
+
+GITHUB_API = "https://api.github.com"
+COMPARE_CONCURRENCY = 8
+
+async def compare_fork(session, headers, budget, fork):
+    # 返回 (ahead_by, behind_by, status, error); 需要时先补全两端的默认分支
+    if not fork['default_branch'] or not fork['parent_default_branch']:
+        status, data, _ = await github_get(session, f"{GITHUB_API}/repos/{fork['full_name']}", headers, budget)
+        if status != 200 or 'parent' not in data:
+            return None, None, 'error', f"获取仓库信息失败: HTTP {status}"
+        fork['default_branch'] = data['default_branch']
+        fork['parent_default_branch'] = data['parent']['default_branch']
+
+    base = quote(fork['parent_default_branch'], safe='')
+    head = quote(f"{fork['owner_login']}:{fork['default_branch']}", safe=':')
+    url = f"{GITHUB_API}/repos/{fork['parent_full_name']}/compare/{base}...{head}?per_page=1"
+    status, data, _ = await github_get(session, url, headers, budget)
+    if status != 200:
+        return None, None, 'error', f"比较失败: HTTP {status}"
+    return data['ahead_by'], data['behind_by'], data['status'], None
+
+async def analyze_forks(token, db_path, force=False, concurrency=COMPARE_CONCURRENCY):
+    # 返回 (已分析数, 候选数); 限额不足时剩余的 Fork 留到下次运行
+    headers = {
+        'Authorization': f'token {token}',
+        'Accept': 'application/vnd.github.v3+json'
+    }
+    forks = await get_fork_analysis_candidates(db_path, force)
+    if not forks:
+        return 0, 0
+
+    budget = RateBudget(concurrency)
+    analyzed = 0
+
+    async def run(session, fork):
+        # 限额不足时返回 None, 留到下次运行; 其他错误记录为该 Fork 的 error 状态
+        try:
+            return fork, await compare_fork(session, headers, budget, fork)
+        except RateLimitExceeded:
+            return fork, None
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError, TypeError) as e:
+            return fork, (None, None, 'error', f"{type(e).__name__}: {e}")
+
+    async with aiohttp.ClientSession() as session, aiosqlite.connect(db_path) as db:
+        for task in asyncio.as_completed([run(session, fork) for fork in forks]):
+            fork, result = await task
+            if result is None:
+                continue
+            ahead_by, behind_by, status, error = result
+            await update_default_branches(db, fork['full_name'], fork['default_branch'], fork['parent_default_branch'])
+            await save_fork_status(db, fork, ahead_by, behind_by, status, error)
+            await db.commit()
+            analyzed += 1
+
+    return analyzed, len(forks)
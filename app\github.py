@@ -1,5 +1,47 @@
+import time
+import asyncio
 import requests
-from .db import save_repo_to_db, save_starred_repo_to_db, save_followed_user_to_db, get_repo_count
+from .db import (save_repo_to_db, save_starred_repo_to_db, save_followed_user_to_db, get_repo_count,
+                 prune_followed_users)
+
+class RateLimitExceeded(Exception):
+    pass
+
+class RateBudget:
+    # 多个并发任务共享的 API 限额: 限制并发请求数, 剩余次数不足时停止发出新请求
+    def __init__(self, concurrency=8, reserve=100):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.reserve = reserve
+        self.remaining = None
+        self.reset_at = 0
+
+    @property
+    def exhausted(self):
+        return (self.remaining is not None and self.remaining <= self.reserve
+                and time.time() < self.reset_at)
+
+    def update(self, headers):
+        if 'X-RateLimit-Remaining' in headers:
+            self.remaining = int(headers['X-RateLimit-Remaining'])
+            self.reset_at = int(headers.get('X-RateLimit-Reset', 0))
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        if self.exhausted:
+            self.semaphore.release()
+            raise RateLimitExceeded(f"API 限额不足, 剩余 {self.remaining} 次")
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.semaphore.release()
+
+async def github_get(session, url, headers, budget):
+    # 返回 (状态码, JSON 数据, 响应头); 非 200 时数据为 None
+    async with budget:
+        async with session.get(url, headers=headers) as response:
+            budget.update(response.headers)
+            data = await response.json() if response.status == 200 else None
+            return response.status, data, response.headers
 
 async def get_github_repos(token, db_path):
     headers = {
@@ -51,6 +93,7 @@ async def get_github_repos(token, db_path):
 
     # 获取用户关注的作者
     page = 1
+    following_logins = set()
     while True:
         url = f'https://api.github.com/user/following?page={page}&per_page=100'
         response = requests.get(url, headers=headers)
@@ -58,8 +101,11 @@ async def get_github_repos(token, db_path):
         if response.status_code == 200:
             followed_users = response.json()
             if not followed_users:
+                # 拿到了完整的关注列表, 清除已取消关注的作者
+                await prune_followed_users(db_path, following_logins)
                 break
             for user in followed_users:
+                following_logins.add(user['login'])
                 await save_followed_user_to_db(user, db_path)
             page += 1
         else:
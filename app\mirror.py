@@ -0,0 +1,89 @@
+import os
+import asyncio
+import base64
+import shutil
+import subprocess
+import aiosqlite
+from concurrent.futures import ProcessPoolExecutor
+from .db import get_mirror_candidates, save_mirror_state
+
+GITHUB_URL = "https://github.com"
+MIRROR_WORKERS = 4
+MIRROR_TIMEOUT = 30 * 60  # 单个仓库 clone/fetch 的最长秒数
+MIRROR_SOURCES = {
+    'repos': ('repos',),
+    'starred': ('starred_repos',),
+    'all': ('repos', 'starred_repos'),
+}
+
+def mirror_one(clone_url, local_path, token=None, timeout=MIRROR_TIMEOUT):
+    # 在子进程中执行: 本地已有镜像时增量 fetch, 否则 clone --mirror
+    git = ['git']
+    env = dict(os.environ, GIT_TERMINAL_PROMPT='0')
+    if token and clone_url.startswith('https://'):
+        # 通过环境变量传入配置, 避免 token 出现在命令行中被 ps 看到
+        auth = base64.b64encode(f"x-access-token:{token}".encode()).decode()
+        env.update(GIT_CONFIG_COUNT='1', GIT_CONFIG_KEY_0='http.extraHeader',
+                   GIT_CONFIG_VALUE_0=f'Authorization: Basic {auth}')
+
+    exists = os.path.isdir(local_path)
+    if exists:
+        command = git + ['--git-dir', local_path, 'fetch', '--prune', 'origin']
+    else:
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        command = git + ['clone', '--mirror', '--quiet', clone_url, local_path]
+
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, env=env, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        if not exists:
+            shutil.rmtree(local_path, ignore_errors=True)
+        return False, f"git 超过 {timeout} 秒未完成, 已终止"
+    except OSError as e:
+        return False, str(e)
+
+    if result.returncode != 0:
+        if not exists:
+            shutil.rmtree(local_path, ignore_errors=True)
+        return False, result.stderr.strip()
+    return True, ''
+
+def mirror_path(dest_dir, full_name):
+    return os.path.join(dest_dir, *full_name.split('/')) + '.git'
+
+async def mirror_repos(db_path, dest_dir, source='all', token=None, base_url=GITHUB_URL,
+                       max_workers=MIRROR_WORKERS, force=False):
+    # base_url 可以是 file:// 地址, 便于用本地裸仓库测试
+    candidates = []
+    for repo in await get_mirror_candidates(db_path, MIRROR_SOURCES[source]):
+        local_path = mirror_path(dest_dir, repo['full_name'])
+        # 镜像目录换了或本地镜像被删除时, 即使远程没有更新也要重新镜像
+        if (force or not repo['up_to_date'] or repo['local_path'] != local_path
+                or not os.path.isdir(local_path)):
+            candidates.append((repo, local_path))
+    if not candidates:
+        return 0, []
+
+    loop = asyncio.get_running_loop()
+    failed = []
+    mirrored = 0
+
+    async def run(pool, repo, local_path):
+        clone_url = f"{base_url.rstrip('/')}/{repo['full_name']}.git"
+        success, error = await loop.run_in_executor(pool, mirror_one, clone_url, local_path, token)
+        return repo, local_path, success, error
+
+    async with aiosqlite.connect(db_path) as db:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            # 按优先级顺序提交, 进程池按提交顺序执行
+            tasks = [asyncio.ensure_future(run(pool, repo, local_path)) for repo, local_path in candidates]
+            for task in asyncio.as_completed(tasks):
+                repo, local_path, success, error = await task
+                await save_mirror_state(db, repo['full_name'], local_path, repo['updated_at'], success, error)
+                await db.commit()
+                if success:
+                    mirrored += 1
+                else:
+                    failed.append((repo['full_name'], error))
+
+    return mirrored, failed
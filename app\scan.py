@@ -0,0 +1,204 @@
+import os
+import re
+import asyncio
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# 没有 .gitignore 时也不应上传的目录
+DEFAULT_EXCLUDES = [
+    '.git/', 'node_modules/', '__pycache__/', '.venv/', 'venv/',
+    '.tox/', '.mypy_cache/', '.pytest_cache/',
+]
+SCAN_WORKERS = 8
+SCAN_QUEUE_SIZE = 1000
+
+ScanEntry = namedtuple('ScanEntry', ['repo_path', 'local_path', 'size'])
+
+def translate_pattern(pattern):
+    # 将 gitignore 通配符转换为正则表达式
+    i, n = 0, len(pattern)
+    parts = []
+    while i < n:
+        if pattern.startswith('**/', i):
+            parts.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            parts.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            parts.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            parts.append('[^/]')
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 2:]:
+            j = pattern.index(']', i + 2)
+            chars = pattern[i + 1:j].replace('\\', '\\\\')
+            if chars.startswith('!'):
+                chars = '^' + chars[1:]
+            parts.append(f'[{chars}]')
+            i = j + 1
+        elif pattern[i] == '\\' and i + 1 < n:
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return ''.join(parts)
+
+def compile_pattern(line, base=''):
+    line = line.rstrip('\n')
+    if not line.endswith('\\ '):
+        line = line.rstrip()
+    if not line or line.startswith('#'):
+        return None
+
+    negate = line.startswith('!')
+    if negate:
+        line = line[1:]
+    dir_only = line.endswith('/')
+    line = line.rstrip('/')
+    anchored = '/' in line
+    line = line.lstrip('/')
+    if not line:
+        return None
+
+    regex = translate_pattern(line)
+    if not anchored:
+        regex = '(?:.*/)?' + regex
+    return re.compile(re.escape(base) + regex), negate, dir_only
+
+def read_patterns(file_path, base=''):
+    try:
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
+            lines = file.readlines()
+    except OSError:
+        return ()
+    rules = (compile_pattern(line, base) for line in lines)
+    return tuple(rule for rule in rules if rule)
+
+class IgnoreRules:
+    # rules 按 gitignore 的优先级从低到高排列, 最后一条匹配的规则生效;
+    # overrides 为用户指定的排除模式, 优先级最高
+    def __init__(self, rules=(), overrides=()):
+        self.rules = rules
+        self.overrides = overrides
+
+    @classmethod
+    def for_root(cls, root, excludes=()):
+        rules = tuple(filter(None, (compile_pattern(p) for p in DEFAULT_EXCLUDES)))
+        rules += read_patterns(os.path.join(root, '.git', 'info', 'exclude'))
+        overrides = tuple(filter(None, (compile_pattern(p) for p in excludes)))
+        return cls(rules, overrides)
+
+    def with_gitignore(self, dir_path, rel_dir):
+        extra = read_patterns(os.path.join(dir_path, '.gitignore'), rel_dir)
+        if not extra:
+            return self
+        return IgnoreRules(self.rules + extra, self.overrides)
+
+    def ignored(self, rel_path, is_dir):
+        result = False
+        for regex, negate, dir_only in self.rules + self.overrides:
+            if dir_only and not is_dir:
+                continue
+            if regex.fullmatch(rel_path):
+                result = not negate
+        return result
+
+class IgnoreChecker:
+    # 对任意仓库内路径应用与扫描相同的忽略规则, 逐级读取的 .gitignore 会被缓存
+    def __init__(self, root, excludes=()):
+        self.root = root
+        self.dir_rules = {'': IgnoreRules.for_root(root, excludes).with_gitignore(root, '')}
+
+    def rules_for(self, rel_dir):
+        # 返回适用于 rel_dir 中条目的规则; rel_dir 本身被忽略时返回 None
+        if rel_dir not in self.dir_rules:
+            parent, _, _ = rel_dir[:-1].rpartition('/')
+            rules = self.rules_for(parent + '/' if parent else '')
+            if rules is not None and not rules.ignored(rel_dir[:-1], True):
+                dir_path = os.path.join(self.root, *rel_dir[:-1].split('/'))
+                rules = rules.with_gitignore(dir_path, rel_dir)
+            else:
+                rules = None
+            self.dir_rules[rel_dir] = rules
+        return self.dir_rules[rel_dir]
+
+    def ignored(self, rel_path):
+        rel_dir, _, _ = rel_path.rpartition('/')
+        rules = self.rules_for(rel_dir + '/' if rel_dir else '')
+        return rules is None or rules.ignored(rel_path, False)
+
+def scan_dir(dir_path, rel_dir, rules):
+    # 在线程池中执行: 扫描单个目录, 返回其中的文件和需要继续扫描的子目录
+    rules = rules.with_gitignore(dir_path, rel_dir)
+    files, subdirs = [], []
+    try:
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                rel_path = rel_dir + entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not rules.ignored(rel_path, True):
+                            subdirs.append((entry.path, rel_path + '/'))
+                    elif entry.is_file():
+                        if not rules.ignored(rel_path, False):
+                            files.append(ScanEntry(rel_path, entry.path, entry.stat().st_size))
+                except OSError:
+                    continue
+    except OSError as e:
+        print(f"扫描目录 {dir_path} 失败: {e}")
+    return files, subdirs, rules
+
+async def scan_paths(paths, queue, excludes=()):
+    # 将扫描到的 ScanEntry 逐个放入有界队列, 结束时放入 None;
+    # 返回 (文件数, 总字节数)
+    loop = asyncio.get_running_loop()
+    file_count = 0
+    total_bytes = 0
+
+    async def walk(executor, dir_path, rel_dir, rules):
+        nonlocal file_count, total_bytes
+        files, subdirs, rules = await loop.run_in_executor(executor, scan_dir, dir_path, rel_dir, rules)
+        for entry in files:
+            file_count += 1
+            total_bytes += entry.size
+            await queue.put(entry)
+        await asyncio.gather(*(walk(executor, path, rel, rules) for path, rel in subdirs))
+
+    try:
+        with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+            for path in paths:
+                if os.path.isfile(path):
+                    size = os.path.getsize(path)
+                    file_count += 1
+                    total_bytes += size
+                    await queue.put(ScanEntry(os.path.basename(path), path, size))
+                elif os.path.isdir(path):
+                    await walk(executor, path, '', IgnoreRules.for_root(path, excludes))
+    except asyncio.CancelledError:
+        # 被消费方取消时没有人再读取队列, 不能再等待放入结束标记
+        raise
+    except BaseException:
+        await queue.put(None)
+        raise
+    await queue.put(None)
+
+    return file_count, total_bytes
+
+async def scan_summary(paths, excludes=()):
+    queue = asyncio.Queue(maxsize=SCAN_QUEUE_SIZE)
+
+    async def drain():
+        while await queue.get() is not None:
+            pass
+
+    file_count, total_bytes = (await asyncio.gather(scan_paths(paths, queue, excludes), drain()))[0]
+    return file_count, total_bytes
+
+def format_size(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{size} B"
+        size /= 1024
@@ -0,0 +1,164 @@
+import gzip
+import json
+import uuid
+import aiosqlite
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_TABLES = ('repos', 'starred_repos', 'followed_users')
+BATCH_SIZE = 1000
+
+# 快照格式 (每行一个 JSON, 整体 gzip 或 zstd 压缩):
+#   {"snapshot_id": ..., "version": 1, "created_at": ...}
+#   {"table": "repos", "columns": [...]}
+#   [行数据...]
+#   ...
+
+def open_snapshot(path, mode):
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError("处理 .zst 快照需要安装 zstandard")
+        return zstandard.open(path, mode, encoding='utf-8')
+    return gzip.open(path, mode, compresslevel=6, encoding='utf-8')
+
+def dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+async def table_columns(db, table):
+    cursor = await db.execute(f"PRAGMA table_info({table})")
+    rows = await cursor.fetchall()
+    return [row[1] for row in rows], [row[1] for row in rows if row[5]]
+
+async def export_snapshot(db_path, path):
+    # 逐批读取并写出, 内存占用与数据量无关; 返回导出的行数
+    exported = 0
+    async with aiosqlite.connect(db_path) as db:
+        with open_snapshot(path, 'wt') as file:
+            file.write(dumps({
+                'snapshot_id': uuid.uuid4().hex,
+                'version': SNAPSHOT_VERSION,
+                'created_at': datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+            }))
+            for table in SNAPSHOT_TABLES:
+                columns, _ = await table_columns(db, table)
+                file.write(dumps({'table': table, 'columns': columns}))
+                cursor = await db.execute(f"SELECT {', '.join(columns)} FROM {table}")
+                while rows := await cursor.fetchmany(BATCH_SIZE):
+                    file.writelines(dumps(list(row)) for row in rows)
+                    exported += len(rows)
+    return exported
+
+def upsert_sql(table, columns, keys):
+    # 以 updated_at 解决冲突: 只有快照中的数据更新时才覆盖本地数据
+    updates = ', '.join(f"{column} = excluded.{column}" for column in columns if column not in keys)
+    sql = (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+           f"ON CONFLICT({', '.join(keys)}) DO UPDATE SET {updates}")
+    if 'updated_at' in columns:
+        sql += f" WHERE {table}.updated_at IS NULL OR excluded.updated_at > {table}.updated_at"
+    else:
+        # 没有 updated_at 的表只在内容不同时更新, 使导入计数只包含实际改动
+        sql += " WHERE " + " OR ".join(
+            f"{table}.{column} IS NOT excluded.{column}" for column in columns if column not in keys)
+    return sql
+
+async def resolve_github_id_conflicts(db, table, columns, keys, rows):
+    # github_id 也是 UNIQUE: 同一仓库改名或转移后, 本地可能还以旧名称存在。
+    # 保留 updated_at 较新的一方: 删除较旧的本地行, 或丢弃较旧的快照行
+    if 'github_id' not in columns or len(keys) != 1 or keys[0] not in columns:
+        return rows
+    key = keys[0]
+    id_index = columns.index('github_id')
+    key_index = columns.index(key)
+    updated_index = columns.index('updated_at') if 'updated_at' in columns else None
+    incoming = {row[id_index]: row for row in rows if row[id_index] is not None}
+    github_ids = list(incoming)
+
+    stale_keys = []
+    skipped = set()
+    for start in range(0, len(github_ids), 500):
+        chunk = github_ids[start:start + 500]
+        cursor = await db.execute(
+            f"SELECT github_id, {key}, {'updated_at' if updated_index is not None else 'NULL'} FROM {table} "
+            f"WHERE github_id IN ({', '.join('?' * len(chunk))})", chunk)
+        for github_id, local_key, local_updated_at in await cursor.fetchall():
+            row = incoming[github_id]
+            if local_key == row[key_index]:
+                continue
+            if updated_index is None or local_updated_at is None or (row[updated_index] or '') > local_updated_at:
+                stale_keys.append(local_key)
+            else:
+                skipped.add(github_id)
+
+    if stale_keys:
+        await db.executemany(f"DELETE FROM {table} WHERE {key} = ?", [(stale_key,) for stale_key in stale_keys])
+    return [row for row in rows if row[id_index] not in skipped]
+
+async def save_import_progress(db, snapshot_id, path, lines_done, completed):
+    await db.execute('''
+    INSERT OR REPLACE INTO snapshot_imports (snapshot_id, path, lines_done, completed, updated_at)
+    VALUES (?, ?, ?, ?, ?)
+    ''', (snapshot_id, path, lines_done, completed, datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")))
+    await db.commit()
+
+async def import_snapshot(db_path, path):
+    # 按批导入并记录进度, 中断后再次导入同一快照会从上次提交的位置继续;
+    # 返回实际写入 (新增或更新) 的行数
+    imported = 0
+    async with aiosqlite.connect(db_path) as db:
+        with open_snapshot(path, 'rt') as file:
+            snapshot_id = json.loads(file.readline())['snapshot_id']
+
+            cursor = await db.execute(
+                "SELECT lines_done, completed FROM snapshot_imports WHERE snapshot_id = ?", (snapshot_id,))
+            state = await cursor.fetchone()
+            lines_done = state[0] if state and not state[1] else 1
+
+            sql = None
+            table = None
+            columns = None
+            keys = None
+            indexes = None
+            batch = []
+
+            async def flush(line_number):
+                # 数据与进度在同一事务中提交
+                nonlocal imported
+                rows = await resolve_github_id_conflicts(db, table, columns, keys, batch)
+                cursor = await db.executemany(sql, rows)
+                imported += max(cursor.rowcount, 0)
+                await save_import_progress(db, snapshot_id, path, line_number, False)
+                batch.clear()
+
+            line_number = 1
+            for line_number, line in enumerate(file, start=2):
+                if line.startswith('{'):
+                    if batch:
+                        await flush(line_number - 1)
+                    table_header = json.loads(line)
+                    table = table_header['table']
+                    sql = None
+                    if table not in SNAPSHOT_TABLES:
+                        continue
+                    # 只导入两端都有的列, 兼容不同版本的数据库结构
+                    local_columns, keys = await table_columns(db, table)
+                    columns = [column for column in table_header['columns'] if column in local_columns]
+                    indexes = [table_header['columns'].index(column) for column in columns]
+                    sql = upsert_sql(table, columns, keys)
+                    continue
+                if sql is None or line_number <= lines_done:
+                    continue
+                row = json.loads(line)
+                batch.append([row[index] for index in indexes])
+                if len(batch) >= BATCH_SIZE:
+                    await flush(line_number)
+
+            if batch:
+                await flush(line_number)
+            await save_import_progress(db, snapshot_id, path, line_number, True)
+
+    return imported
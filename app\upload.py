@@ -5,8 +5,16 @@ import aiosqlite
 import base64
 import json
 import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from .db import save_repo_to_db
+from .scan import SCAN_QUEUE_SIZE, IgnoreChecker, scan_paths, format_size
 
-async def upload_repo(token, repo_name, description, db_path, paths):
+GITHUB_API = "https://api.github.com"
+BLOB_UPLOAD_CONCURRENCY = 8
+HASH_WORKERS = (os.cpu_count() or 1) * 2
+
+async def upload_repo(token, repo_name, description, db_path, paths, excludes=()):
     headers = {
         "Authorization": f"token {token}",
         "Accept": "application/vnd.github.v3+json"
@@ -45,16 +53,12 @@ async def upload_repo(token, repo_name, description, db_path, paths):
             return False, "创建仓库失败: 未知错误"
         
         # 上传文件和文件夹
-        for path in paths:
-            if os.path.isfile(path):
-                await upload_file(session, headers, repo_data['full_name'], path)
-            elif os.path.isdir(path):
-                await upload_folder(session, headers, repo_data['full_name'], path)
+        file_count, total_bytes = await upload_paths(session, headers, repo_data['full_name'], paths, excludes)
     
     # 将仓库信息保存到数据库
     await insert_repo(db_path, repo_data)
     
-    return True, f"仓库 '{repo_name}' 创建成功"
+    return True, f"仓库 '{repo_name}' 创建成功, 共 {file_count} 个文件 ({format_size(total_bytes)})"
 
 async def upload_file(session, headers, repo_full_name, file_path, relative_path=None):
     with open(file_path, 'rb') as file:
@@ -73,12 +77,227 @@ async def upload_file(session, headers, repo_full_name, file_path, relative_path
         if response.status != 201:
             print(f"上传文件 {file_name} 失败")
 
-async def upload_folder(session, headers, repo_full_name, folder_path):
-    for root, dirs, files in os.walk(folder_path):
-        for file in files:
-            file_path = os.path.join(root, file)
-            relative_path = os.path.relpath(file_path, folder_path)
-            await upload_file(session, headers, repo_full_name, file_path, relative_path)
+async def upload_paths(session, headers, repo_full_name, paths, excludes=()):
+    # 扫描与上传同时进行; 内容 API 的每次上传都是一次提交, 因此逐个上传以免冲突
+    queue = asyncio.Queue(maxsize=SCAN_QUEUE_SIZE)
+    scanner = asyncio.create_task(scan_paths(paths, queue, excludes))
+    try:
+        while (entry := await queue.get()) is not None:
+            await upload_file(session, headers, repo_full_name, entry.local_path, entry.repo_path)
+        return await scanner
+    finally:
+        # 上传出错时扫描可能还阻塞在已满的队列上
+        scanner.cancel()
+
+def git_blob_sha(file_path):
+    # 与 git hash-object 相同: sha1("blob <size>\0" + content); 符号链接的内容是链接目标本身
+    sha = hashlib.sha1()
+    if os.path.islink(file_path):
+        target = os.fsencode(os.readlink(file_path))
+        sha.update(f"blob {len(target)}\0".encode() + target)
+        return sha.hexdigest()
+    sha.update(f"blob {os.path.getsize(file_path)}\0".encode())
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def read_base64(file_path):
+    if os.path.islink(file_path):
+        return base64.b64encode(os.fsencode(os.readlink(file_path))).decode()
+    with open(file_path, 'rb') as file:
+        return base64.b64encode(file.read()).decode()
+
+def file_mode(file_path, remote_mode=None):
+    # 只有本地也是符号链接时才使用 120000; Windows 上没有可执行位, 沿用远程的普通文件模式
+    if os.path.islink(file_path):
+        return '120000'
+    if os.name == 'nt':
+        return remote_mode if remote_mode in ('100644', '100755') else '100644'
+    return '100755' if os.access(file_path, os.X_OK) else '100644'
+
+async def api_error(response, action):
+    try:
+        error_data = await response.json()
+    except (aiohttp.ContentTypeError, json.JSONDecodeError):
+        return f"{action}失败: HTTP {response.status}"
+    error_message = error_data.get('message', '未知错误')
+    if 'errors' in error_data:
+        error_message += ": " + json.dumps(error_data['errors'])
+    return f"{action}失败: {error_message}"
+
+async def update_repo(token, repo_name, db_path, paths, excludes=(), allow_delete=False):
+    # 返回 (True/False, 消息); 需要删除远程文件而 allow_delete 为 False 时,
+    # 不提交任何改动并返回 (None, 待删除路径列表), 由调用方确认后再次调用
+    headers = {
+        "Authorization": f"token {token}",
+        "Accept": "application/vnd.github.v3+json"
+    }
+
+    async with aiohttp.ClientSession() as session:
+        repo_full_name = repo_name
+        if '/' not in repo_full_name:
+            async with session.get(f"{GITHUB_API}/user", headers=headers) as response:
+                if response.status != 200:
+                    return False, await api_error(response, "获取用户信息")
+                user = await response.json()
+            repo_full_name = f"{user['login']}/{repo_name}"
+
+        repo_url = f"{GITHUB_API}/repos/{repo_full_name}"
+        async with session.get(repo_url, headers=headers) as response:
+            if response.status == 404:
+                return False, f"仓库 '{repo_full_name}' 不存在"
+            if response.status != 200:
+                return False, await api_error(response, "获取仓库信息")
+            repo_data = await response.json()
+
+        branch = repo_data['default_branch']
+        async with session.get(f"{repo_url}/git/ref/heads/{branch}", headers=headers) as response:
+            if response.status in (404, 409):
+                # 空仓库没有提交, Git Data API 不可用, 退回逐个文件上传
+                await upload_paths(session, headers, repo_full_name, paths, excludes)
+                await save_repo_to_db(repo_data, db_path)
+                return True, f"仓库 '{repo_full_name}' 更新成功"
+            if response.status != 200:
+                return False, await api_error(response, "获取分支信息")
+            head_sha = (await response.json())['object']['sha']
+
+        async with session.get(f"{repo_url}/git/commits/{head_sha}", headers=headers) as response:
+            if response.status != 200:
+                return False, await api_error(response, "获取提交信息")
+            base_tree_sha = (await response.json())['tree']['sha']
+
+        # 一次性递归获取远程目录树
+        async with session.get(f"{repo_url}/git/trees/{base_tree_sha}?recursive=1", headers=headers) as response:
+            if response.status != 200:
+                return False, await api_error(response, "获取目录树")
+            tree_data = await response.json()
+        if tree_data.get('truncated'):
+            return False, "远程目录树过大, 无法进行增量更新"
+        remote_files = {
+            entry['path']: entry for entry in tree_data['tree'] if entry['type'] == 'blob'
+        }
+
+        semaphore = asyncio.Semaphore(BLOB_UPLOAD_CONCURRENCY)
+        loop = asyncio.get_running_loop()
+        local_shas = {}
+        local_modes = {}
+        local_paths = {}
+
+        errors = []
+
+        async def process(pool, entry):
+            # 在进程池中计算 blob SHA
+            sha = await loop.run_in_executor(pool, git_blob_sha, entry.local_path)
+            remote = remote_files.get(entry.repo_path)
+            local_shas[entry.repo_path] = sha
+            local_modes[entry.repo_path] = file_mode(entry.local_path, remote and remote['mode'])
+            local_paths[entry.repo_path] = entry.local_path
+
+        async def create_blob(path):
+            # 读取和编码放在信号量内, 同时驻留内存的文件不超过 BLOB_UPLOAD_CONCURRENCY 个
+            async with semaphore:
+                content = await loop.run_in_executor(None, read_base64, local_paths[path])
+                async with session.post(f"{repo_url}/git/blobs", headers=headers,
+                                        json={"content": content, "encoding": "base64"}) as response:
+                    if response.status != 201:
+                        raise RuntimeError(await api_error(response, f"上传文件 {path} "))
+
+        async def worker(pool):
+            # 固定数量的 worker 消费队列, 队列满时扫描会等待
+            while (entry := await queue.get()) is not None:
+                if errors:
+                    continue  # 已经失败, 只需继续取出队列中的条目, 让扫描结束
+                try:
+                    await process(pool, entry)
+                except (RuntimeError, OSError, aiohttp.ClientError) as e:
+                    errors.append(str(e))
+            await queue.put(None)  # 让其他 worker 也能收到结束标记
+
+        # 扫描与哈希流水线并行
+        queue = asyncio.Queue(maxsize=SCAN_QUEUE_SIZE)
+        scanner = asyncio.create_task(scan_paths(paths, queue, excludes))
+        with ProcessPoolExecutor() as pool:
+            workers = [asyncio.create_task(worker(pool)) for _ in range(HASH_WORKERS)]
+            try:
+                await asyncio.gather(*workers)
+                file_count, total_bytes = await scanner
+            finally:
+                # worker 抛出未预料的异常时, 取消其余任务, 不留下挂起的扫描
+                for task in workers + [scanner]:
+                    task.cancel()
+        if errors:
+            return False, errors[0]
+
+        added = [path for path in local_shas if path not in remote_files]
+        changed = [
+            path for path in local_shas
+            if path in remote_files and (remote_files[path]['sha'] != local_shas[path]
+                                         or remote_files[path]['mode'] != local_modes[path])
+        ]
+
+        # 忽略规则只决定上传哪些文件: 本地仍存在或被忽略的远程文件不删除
+        checkers = [IgnoreChecker(path, excludes) for path in paths if os.path.isdir(path)]
+        removed = [
+            path for path in remote_files
+            if path not in local_shas and not any(
+                os.path.lexists(os.path.join(checker.root, *path.split('/'))) or checker.ignored(path)
+                for checker in checkers
+            )
+        ]
+
+        if not (added or changed or removed):
+            return True, f"仓库 '{repo_full_name}' 没有需要更新的文件"
+        if removed and not allow_delete:
+            return None, removed
+
+        # 确认需要删除的文件之后才上传, 避免确认后重新调用时重复上传
+        uploads = added + [path for path in changed if remote_files[path]['sha'] != local_shas[path]]
+        blob_tasks = [asyncio.create_task(create_blob(path)) for path in uploads]
+        try:
+            await asyncio.gather(*blob_tasks)
+        except (RuntimeError, OSError, aiohttp.ClientError) as e:
+            return False, str(e)
+        finally:
+            for task in blob_tasks:
+                task.cancel()
+
+        tree = [
+            {"path": path, "mode": local_modes[path], "type": "blob", "sha": local_shas[path]}
+            for path in added + changed
+        ]
+        tree += [
+            {"path": path, "mode": remote_files[path]['mode'], "type": "blob", "sha": None}
+            for path in removed
+        ]
+
+        async with session.post(f"{repo_url}/git/trees", headers=headers,
+                                json={"base_tree": base_tree_sha, "tree": tree}) as response:
+            if response.status != 201:
+                return False, await api_error(response, "创建目录树")
+            new_tree_sha = (await response.json())['sha']
+
+        message = f"Update {len(added)} added, {len(changed)} changed, {len(removed)} removed files"
+        async with session.post(f"{repo_url}/git/commits", headers=headers,
+                                json={"message": message, "tree": new_tree_sha,
+                                      "parents": [head_sha]}) as response:
+            if response.status != 201:
+                return False, await api_error(response, "创建提交")
+            commit_sha = (await response.json())['sha']
+
+        async with session.patch(f"{repo_url}/git/refs/heads/{branch}", headers=headers,
+                                 json={"sha": commit_sha}) as response:
+            if response.status != 200:
+                return False, await api_error(response, "更新分支")
+
+        async with session.get(repo_url, headers=headers) as response:
+            if response.status == 200:
+                repo_data = await response.json()
+
+    await save_repo_to_db(repo_data, db_path)
+
+    return True, (f"仓库 '{repo_full_name}' 更新成功 (扫描 {file_count} 个文件, {format_size(total_bytes)}): "
+                  f"新增 {len(added)} 个, 修改 {len(changed)} 个, 删除 {len(removed)} 个文件")
 
 async def insert_repo(db_path, repo_data):
     async with aiosqlite.connect(db_path) as db:
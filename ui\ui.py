@@ -5,13 +5,20 @@ import json
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QTableWidget, QTableWidgetItem, 
                              QVBoxLayout, QWidget, QHeaderView, QAbstractItemView, QTabWidget,
                              QLineEdit, QPushButton, QHBoxLayout, QMessageBox, QLabel, QProgressBar,
-                             QStyleFactory, QFileDialog, QTreeView, QTextEdit, QDialog)  # 添加 QTextEdit 和 QDialog
+                             QStyleFactory, QFileDialog, QTreeView, QTextEdit, QDialog, QCompleter,
+                             QComboBox)  # 添加 QTextEdit 和 QDialog
 from PyQt5.QtCore import Qt, QUrl, QRunnable, QThreadPool, QObject, pyqtSignal, pyqtSlot
 from PyQt5.QtGui import QDesktopServices, QColor, QFont, QIcon
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from app.db import get_all_repos, get_starred_repos, get_followed_users, init_database
+from app.db import (get_all_repos, get_starred_repos, get_followed_users, init_database,
+                    get_recent_followed_repos)
 from app.github import get_github_repos
-from app.upload import upload_repo
+from app.upload import upload_repo, update_repo
+from app.scan import scan_summary, format_size
+from app.mirror import mirror_repos
+from app.forks import analyze_forks
+from app.following import sync_followed_repos
+from app.snapshot import export_snapshot, import_snapshot
 
 class AsyncWorker(QRunnable):
     class Signals(QObject):
@@ -62,6 +69,19 @@ class HyperlinkItem(QTableWidgetItem):
         self.setForeground(QColor('blue'))
         self.setFlags(self.flags() | Qt.ItemIsSelectable)
 
+class SortableItem(QTableWidgetItem):
+    # 按数值排序的单元格, 没有值的排在最后
+    def __init__(self, value):
+        super().__init__('' if value is None else str(value))
+        self.sort_value = value
+
+    def __lt__(self, other):
+        if isinstance(other, SortableItem):
+            if self.sort_value is None or other.sort_value is None:
+                return other.sort_value is None and self.sort_value is not None
+            return self.sort_value < other.sort_value
+        return super().__lt__(other)
+
 class RepoViewer(QMainWindow):
     def __init__(self, db_path):
         super().__init__()
@@ -147,6 +167,52 @@ class RepoViewer(QMainWindow):
         upload_button.clicked.connect(self.upload_repo)
         layout.addWidget(upload_button)
 
+        # 添加更新已有仓库按钮, 目标仓库可以手动输入或从已有仓库中补全
+        update_repo_layout = QHBoxLayout()
+        self.target_repo_input = QLineEdit()
+        self.target_repo_input.setPlaceholderText("目标仓库 (owner/name), 留空则使用所选文件夹名")
+        self.target_repo_completer = QCompleter([], self)
+        self.target_repo_completer.setCaseSensitivity(Qt.CaseInsensitive)
+        self.target_repo_completer.setFilterMode(Qt.MatchContains)
+        self.target_repo_input.setCompleter(self.target_repo_completer)
+        update_repo_button = QPushButton("更新已有仓库")
+        update_repo_button.clicked.connect(lambda: self.update_existing_repo())
+        update_repo_layout.addWidget(self.target_repo_input)
+        update_repo_layout.addWidget(update_repo_button)
+        layout.addLayout(update_repo_layout)
+
+        # 添加镜像到本地按钮
+        mirror_layout = QHBoxLayout()
+        self.mirror_source_combo = QComboBox()
+        self.mirror_source_combo.addItem("全部仓库", 'all')
+        self.mirror_source_combo.addItem("我的仓库", 'repos')
+        self.mirror_source_combo.addItem("标星的仓库", 'starred')
+        mirror_button = QPushButton("镜像到本地")
+        mirror_button.clicked.connect(self.mirror_repos)
+        mirror_layout.addWidget(self.mirror_source_combo)
+        mirror_layout.addWidget(mirror_button)
+        layout.addLayout(mirror_layout)
+
+        # 添加 Fork 落后分析按钮
+        analyze_forks_button = QPushButton("分析 Fork 落后情况")
+        analyze_forks_button.clicked.connect(self.analyze_forks)
+        layout.addWidget(analyze_forks_button)
+
+        # 添加同步关注者仓库按钮
+        sync_following_button = QPushButton("同步关注者仓库")
+        sync_following_button.clicked.connect(self.sync_following)
+        layout.addWidget(sync_following_button)
+
+        # 添加快照导出/导入按钮
+        snapshot_layout = QHBoxLayout()
+        export_snapshot_button = QPushButton("导出快照")
+        export_snapshot_button.clicked.connect(self.export_snapshot)
+        import_snapshot_button = QPushButton("导入快照")
+        import_snapshot_button.clicked.connect(self.import_snapshot)
+        snapshot_layout.addWidget(export_snapshot_button)
+        snapshot_layout.addWidget(import_snapshot_button)
+        layout.addLayout(snapshot_layout)
+
         # 添加文件和文件夹选择功能
         self.add_file_folder_selection_ui(layout)
 
@@ -162,11 +228,13 @@ class RepoViewer(QMainWindow):
         self.fork_repos_table = self.create_table()
         self.starred_table = self.create_table()
         self.followed_table = self.create_table()
+        self.followed_activity_table = self.create_table()
 
         self.tabs.addTab(self.original_repos_table, "原创仓库")
         self.tabs.addTab(self.fork_repos_table, "Fork 仓库")
         self.tabs.addTab(self.starred_table, "标星的仓库")
         self.tabs.addTab(self.followed_table, "关注的作者")
+        self.tabs.addTab(self.followed_activity_table, "关注者最近更新")
 
     def create_table(self):
         table = QTableWidget()
@@ -225,18 +293,26 @@ class RepoViewer(QMainWindow):
         self.load_repos_data()
         self.load_starred_data()
         self.load_followed_data()
+        self.load_followed_activity_data()
 
     def load_repos_data(self):
-        worker = AsyncWorker(get_all_repos(self.db_path))
+        worker = AsyncWorker(self.load_all_repos())
         worker.signals.result.connect(self.on_repos_loaded)
         worker.signals.error.connect(self.on_error)
         self.threadpool.start(worker)
 
+    async def load_all_repos(self):
+        # 确保旧数据库已升级 (fork_status 表等) 后再查询
+        await init_database(self.db_path)
+        return await get_all_repos(self.db_path)
+
     def on_repos_loaded(self, repos):
         if not repos:
             QMessageBox.information(self, "无数据", "数据库中没有仓库信息，请更新数据")
             return
 
+        self.target_repo_completer.model().setStringList([repo['full_name'] for repo in repos])
+
         original_repos = [repo for repo in repos if not repo['is_fork']]
         fork_repos = [repo for repo in repos if repo['is_fork']]
 
@@ -244,10 +320,12 @@ class RepoViewer(QMainWindow):
         self.populate_repos_table(self.fork_repos_table, fork_repos, include_fork_info=True)
 
     def populate_repos_table(self, table, repos, include_fork_info=False):
+        table.setSortingEnabled(False)  # 填充期间关闭排序, 避免行错位
         table.setRowCount(len(repos))
         if include_fork_info:
-            table.setColumnCount(6)
-            table.setHorizontalHeaderLabels(['名称', '描述', '星标数', '原仓库', '原仓库URL', '更新时间'])
+            table.setColumnCount(8)
+            table.setHorizontalHeaderLabels(['名称', '描述', '星标数', '原仓库', '原仓库URL',
+                                             '落后提交数', '领先提交数', '更新时间'])
         else:
             table.setColumnCount(4)
             table.setHorizontalHeaderLabels(['名称', '描述', '星标数', '更新时间'])
@@ -263,7 +341,9 @@ class RepoViewer(QMainWindow):
                     table.setItem(row, 4, HyperlinkItem('链接', repo['parent_html_url']))
                 else:
                     table.setItem(row, 4, QTableWidgetItem(''))
-                table.setItem(row, 5, QTableWidgetItem(repo.get('updated_at', 'N/A')))
+                table.setItem(row, 5, SortableItem(repo.get('behind_by')))
+                table.setItem(row, 6, SortableItem(repo.get('ahead_by')))
+                table.setItem(row, 7, QTableWidgetItem(repo.get('updated_at', 'N/A')))
             else:
                 table.setItem(row, 3, QTableWidgetItem(repo.get('updated_at', 'N/A')))
 
@@ -271,6 +351,7 @@ class RepoViewer(QMainWindow):
 
         table.resizeColumnsToContents()
         table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        table.setSortingEnabled(include_fork_info)
 
     def load_starred_data(self):
         worker = AsyncWorker(get_starred_repos(self.db_path))
@@ -318,6 +399,38 @@ class RepoViewer(QMainWindow):
         self.followed_table.resizeColumnsToContents()
         self.followed_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
 
+    def load_followed_activity_data(self):
+        worker = AsyncWorker(self.load_recent_followed_repos())
+        worker.signals.result.connect(self.on_followed_activity_loaded)
+        worker.signals.error.connect(self.on_error)
+        self.threadpool.start(worker)
+
+    async def load_recent_followed_repos(self):
+        await init_database(self.db_path)
+        return await get_recent_followed_repos(self.db_path)
+
+    def on_followed_activity_loaded(self, repos):
+        if not repos:
+            return  # 如果还没有同步关注者的仓库，不显示任何内容
+
+        table = self.followed_activity_table
+        table.setRowCount(len(repos))
+        table.setColumnCount(6)
+        table.setHorizontalHeaderLabels(['名称', '描述', '作者', '星标数', '语言', '更新时间'])
+
+        for row, repo in enumerate(repos):
+            table.setItem(row, 0, HyperlinkItem(repo['full_name'], repo['html_url']))
+            table.setItem(row, 1, QTableWidgetItem(self.truncate_text(repo['description'] or '', 30)))
+            table.setItem(row, 2, QTableWidgetItem(repo['owner_login']))
+            table.setItem(row, 3, QTableWidgetItem(str(repo['stargazers_count'])))
+            table.setItem(row, 4, QTableWidgetItem(repo['language'] or ''))
+            table.setItem(row, 5, QTableWidgetItem(repo['updated_at']))
+
+            table.item(row, 1).setToolTip(repo['description'] or '')
+
+        table.resizeColumnsToContents()
+        table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+
     def truncate_text(self, text, max_length):
         return (text[:max_length] + '...') if len(text) > max_length else text
 
@@ -331,6 +444,7 @@ class RepoViewer(QMainWindow):
         
         self.path_input = QLineEdit()
         self.path_input.setPlaceholderText("选择文件或文件夹路径")
+        self.path_input.editingFinished.connect(self.update_scan_summary)
         select_file_button = QPushButton("选择文件")
         select_file_button.clicked.connect(self.select_file)
         select_folder_button = QPushButton("选择文件夹")
@@ -342,12 +456,23 @@ class RepoViewer(QMainWindow):
         
         layout.addLayout(file_folder_layout)
 
+        # 排除模式 (gitignore 语法), 与 .gitignore 和 .git/info/exclude 一起生效
+        exclude_layout = QHBoxLayout()
+        self.exclude_input = QLineEdit()
+        self.exclude_input.setPlaceholderText("排除模式, 用逗号分隔, 例如: *.log, build/")
+        self.exclude_input.editingFinished.connect(self.update_scan_summary)
+        self.scan_summary_label = QLabel("")
+        exclude_layout.addWidget(self.exclude_input)
+        exclude_layout.addWidget(self.scan_summary_label)
+        layout.addLayout(exclude_layout)
+
     def select_file(self):
         file_path, _ = QFileDialog.getOpenFileName(self, "选择文件")
         if file_path:
             current_paths = self.path_input.text().split(", ") if self.path_input.text() else []
             current_paths.append(file_path)
             self.path_input.setText(", ".join(current_paths))
+            self.update_scan_summary()
 
     def select_folder(self):
         folder_path = QFileDialog.getExistingDirectory(self, "选择文件夹")
@@ -355,13 +480,35 @@ class RepoViewer(QMainWindow):
             current_paths = self.path_input.text().split(", ") if self.path_input.text() else []
             current_paths.append(folder_path)
             self.path_input.setText(", ".join(current_paths))
+            self.update_scan_summary()
+
+    def get_selected_paths(self):
+        return [path.strip() for path in self.path_input.text().split(",") if path.strip()]
+
+    def get_exclude_patterns(self):
+        return [pattern.strip() for pattern in self.exclude_input.text().split(",") if pattern.strip()]
+
+    def update_scan_summary(self):
+        paths = self.get_selected_paths()
+        if not paths:
+            self.scan_summary_label.setText("")
+            return
+        self.scan_summary_label.setText("正在扫描...")
+        worker = AsyncWorker(scan_summary(paths, self.get_exclude_patterns()))
+        worker.signals.result.connect(self.on_scan_summary)
+        worker.signals.error.connect(self.on_error)
+        self.threadpool.start(worker)
+
+    def on_scan_summary(self, result):
+        file_count, total_bytes = result
+        self.scan_summary_label.setText(f"待上传: {file_count} 个文件, {format_size(total_bytes)}")
 
     def upload_repo(self):
         if not self.token:
             QMessageBox.warning(self, "错误", "请先保存 GitHub Token")
             return
 
-        paths = [path.strip() for path in self.path_input.text().split(",") if path.strip()]
+        paths = self.get_selected_paths()
         
         if not paths:
             QMessageBox.warning(self, "错误", "请选择至少一个文件或文件夹")
@@ -374,11 +521,183 @@ class RepoViewer(QMainWindow):
         self.progress_bar.setVisible(True)
         self.progress_bar.setRange(0, 0)  # 设置为忙碌状态
         
-        worker = AsyncWorker(upload_repo(self.token, repo_name, description, self.db_path, paths))
+        worker = AsyncWorker(upload_repo(self.token, repo_name, description, self.db_path, paths,
+                                         self.get_exclude_patterns()))
         worker.signals.result.connect(self.on_upload_complete)
         worker.signals.error.connect(self.on_upload_error)
         self.threadpool.start(worker)
     
+    def update_existing_repo(self, allow_delete=False):
+        if not self.token:
+            QMessageBox.warning(self, "错误", "请先保存 GitHub Token")
+            return
+
+        paths = self.get_selected_paths()
+
+        if not paths:
+            QMessageBox.warning(self, "错误", "请选择至少一个文件或文件夹")
+            return
+
+        # 未指定目标仓库时, 以选择的文件或文件夹的名称作为仓库名
+        repo_name = self.target_repo_input.text().strip() or os.path.basename(paths[0])
+
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setRange(0, 0)  # 设置为忙碌状态
+
+        worker = AsyncWorker(update_repo(self.token, repo_name, self.db_path, paths,
+                                         self.get_exclude_patterns(), allow_delete))
+        worker.signals.result.connect(self.on_update_repo_complete)
+        worker.signals.error.connect(self.on_upload_error)
+        self.threadpool.start(worker)
+
+    def mirror_repos(self):
+        dest_dir = QFileDialog.getExistingDirectory(self, "选择镜像目录")
+        if not dest_dir:
+            return
+
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setRange(0, 0)  # 设置为忙碌状态
+
+        source = self.mirror_source_combo.currentData()
+        worker = AsyncWorker(self.mirror_all_repos(dest_dir, source))
+        worker.signals.result.connect(self.on_mirror_complete)
+        worker.signals.error.connect(self.on_error)
+        self.threadpool.start(worker)
+
+    async def mirror_all_repos(self, dest_dir, source):
+        await init_database(self.db_path)
+        return await mirror_repos(self.db_path, dest_dir, source=source, token=self.token)
+
+    def on_mirror_complete(self, result):
+        self.progress_bar.setVisible(False)
+        mirrored, failed = result
+        if failed:
+            error_message = f"已镜像 {mirrored} 个仓库, {len(failed)} 个失败:\n\n"
+            error_message += "\n".join(f"{full_name}: {error}" for full_name, error in failed)
+            error_dialog = ErrorDialog(error_message, self)
+            error_dialog.exec_()
+        else:
+            QMessageBox.information(self, "镜像完成", f"已镜像 {mirrored} 个仓库")
+
+    def analyze_forks(self):
+        if not self.token:
+            QMessageBox.warning(self, "错误", "请先保存 GitHub Token")
+            return
+
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setRange(0, 0)  # 设置为忙碌状态
+
+        worker = AsyncWorker(self.analyze_all_forks())
+        worker.signals.result.connect(self.on_analyze_forks_complete)
+        worker.signals.error.connect(self.on_error)
+        self.threadpool.start(worker)
+
+    async def analyze_all_forks(self):
+        await init_database(self.db_path)
+        return await analyze_forks(self.token, self.db_path)
+
+    def on_analyze_forks_complete(self, result):
+        self.progress_bar.setVisible(False)
+        analyzed, total = result
+        if total == 0:
+            message = "所有 Fork 的分析结果都是最新的"
+        elif analyzed < total:
+            message = f"已分析 {analyzed}/{total} 个 Fork, 其余将在下次分析时继续"
+        else:
+            message = f"已分析 {analyzed} 个 Fork"
+        QMessageBox.information(self, "分析完成", message)
+        self.load_repos_data()
+
+    def sync_following(self):
+        if not self.token:
+            QMessageBox.warning(self, "错误", "请先保存 GitHub Token")
+            return
+
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setRange(0, 0)  # 设置为忙碌状态
+
+        worker = AsyncWorker(self.sync_all_following())
+        worker.signals.result.connect(self.on_sync_following_complete)
+        worker.signals.error.connect(self.on_error)
+        self.threadpool.start(worker)
+
+    async def sync_all_following(self):
+        await init_database(self.db_path)
+        return await sync_followed_repos(self.token, self.db_path)
+
+    def on_sync_following_complete(self, result):
+        self.progress_bar.setVisible(False)
+        updated, unchanged, failed = result
+        message = f"{updated} 位作者有更新, {unchanged} 位无变化"
+        if failed:
+            error_message = message + f", {len(failed)} 位失败:\n\n"
+            error_message += "\n".join(f"{login}: {error}" for login, error in failed)
+            error_dialog = ErrorDialog(error_message, self)
+            error_dialog.exec_()
+        else:
+            QMessageBox.information(self, "同步完成", message)
+        self.load_followed_activity_data()
+
+    def export_snapshot(self):
+        path, _ = QFileDialog.getSaveFileName(self, "导出快照", "github_repos.jsonl.gz",
+                                              "快照文件 (*.jsonl.gz *.jsonl.zst)")
+        if not path:
+            return
+
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setRange(0, 0)  # 设置为忙碌状态
+
+        worker = AsyncWorker(self.export_database_snapshot(path))
+        worker.signals.result.connect(
+            lambda count: self.on_snapshot_complete("导出完成", f"已导出 {count} 条记录"))
+        worker.signals.error.connect(self.on_error)
+        self.threadpool.start(worker)
+
+    async def export_database_snapshot(self, path):
+        await init_database(self.db_path)
+        return await export_snapshot(self.db_path, path)
+
+    def import_snapshot(self):
+        path, _ = QFileDialog.getOpenFileName(self, "导入快照", "", "快照文件 (*.jsonl.gz *.jsonl.zst)")
+        if not path:
+            return
+
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setRange(0, 0)  # 设置为忙碌状态
+
+        worker = AsyncWorker(self.import_database_snapshot(path))
+        worker.signals.result.connect(
+            lambda count: self.on_snapshot_complete("导入完成", f"已导入 {count} 条记录"))
+        worker.signals.error.connect(self.on_error)
+        self.threadpool.start(worker)
+
+    async def import_database_snapshot(self, path):
+        await init_database(self.db_path)
+        return await import_snapshot(self.db_path, path)
+
+    def on_snapshot_complete(self, title, message):
+        self.progress_bar.setVisible(False)
+        QMessageBox.information(self, title, message)
+        self.load_data()
+
+    def on_update_repo_complete(self, result):
+        success, detail = result
+        if success is not None:
+            self.on_upload_complete(result)
+            return
+
+        # 删除远程文件前需要用户确认
+        self.progress_bar.setVisible(False)
+        preview = "\n".join(detail[:20])
+        if len(detail) > 20:
+            preview += f"\n... 等共 {len(detail)} 个文件"
+        reply = QMessageBox.warning(
+            self, "确认删除",
+            f"以下 {len(detail)} 个文件在本地已不存在, 将从远程仓库删除:\n\n{preview}\n\n是否继续?",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply == QMessageBox.Yes:
+            self.update_existing_repo(allow_delete=True)
+
     def on_upload_complete(self, result):
         self.progress_bar.setVisible(False)
         success, message = result